@@ -3,98 +3,240 @@
 Ищет целевые слова и их формы в тексте.
 """
 
+import atexit
+import os
+import pickle
 import re
+import sys
+import unicodedata
+from collections import Counter
+from functools import lru_cache
 from typing import List, Dict
+import ahocorasick
 from pymorphy3 import MorphAnalyzer
-from config import TARGET_WORDS, WORDS_LEMMA
-from razdel import tokenize
+from config import (
+    TARGET_WORDS,
+    WORDS_LEMMA,
+    LEMMA_CACHE_PATH,
+    LEMMA_CACHE_FLUSH_EVERY,
+    LRU_CACHE_SIZE,
+    logger,
+)
+# Управляющие символы и невидимые пробелы, которые ломают поиск по тексту.
+# ZWJ/ZWNJ не трогаем: первый склеивает составные эмодзи, второй значим
+# в ряде письменностей
+_CTRL_RE = re.compile("[\\x00-\\x08\\x0b\\x0c\\x0e-\\x1f\\u200b\\ufeff]")
+
+# Один словарь pymorphy3 (~15 МБ DAWG) на весь процесс: все экземпляры
+# TextAnalyzer разделяют его вместо загрузки собственной копии
+_MORPH = MorphAnalyzer()
+
+# Таблица экранирования спецсимволов MarkdownV2: один C-проход str.translate
+# (обратный слэш тоже спецсимвол - без него ломается разметка)
+_MD2 = str.maketrans({c: "\\" + c for c in "\\" + r"_*[]()~`>#+-=|{}.!"})
+
+# Кэш "слово -> нижний регистр": частые токены не пересканируются заново
+_LOWER_CACHE: Dict[str, str] = {}
+
+def _lower(word: str) -> str:
+    """str.lower с маленьким кэшем для часто повторяющихся слов"""
+    result = _LOWER_CACHE.get(word)
+    if result is None:
+        if len(_LOWER_CACHE) > 10000:
+            _LOWER_CACHE.clear()
+        result = _LOWER_CACHE[word] = word.lower()
+    return result
 
 class TextAnalyzer:
-    
+
     def __init__(self, target_words: List[str]):
-        self.morph = MorphAnalyzer()
+        self.morph = _MORPH
         self.target_words = set(word.lower() for word in target_words)
         self.words_lemma: Dict[str, str] = WORDS_LEMMA
-        self.cache = {}  # Кэш для ускорения
-        
-    def normalize_word(self, word: str) -> str:
-        """Приводит слово к начальной форме (напр. ед.ч., именит. падеж для сущ.)"""
-        word_lower = word.lower()
-        
+        self.cache = self._load_cache()  # Кэш для ускорения (живет на диске)
+        self._dirty = 0  # Сколько новых слов добавили с последнего сохранения
+        atexit.register(self._save_cache)
+
+        # Все известные поверхностные формы целевых слов -> лемма.
+        # Заполняем из лексем pymorphy3 и из ручного словаря форм
+        self._form_lemma: Dict[str, str] = {}
+        for target in self.target_words:
+            # Обходим лексемы всех разборов: для слов вне словаря (нейронка)
+            # первый разбор дает не все падежи
+            for parsed in self.morph.parse(target):
+                for form in parsed.lexeme:
+                    self._form_lemma.setdefault(form.word.lower(), target)
+        for form, lemma in self.words_lemma.items():
+            if lemma.lower() in self.target_words:
+                self._form_lemma.setdefault(form.lower(), lemma.lower())
+
+        # Сито для незнакомых слов: по первой букве и длине отсекаем
+        # большинство токенов, не трогая pymorphy3
+        self._first_chars = {form[0] for form in self._form_lemma}
+        form_lengths = [len(form) for form in self._form_lemma]
+        self._min_form_len = min(form_lengths)
+        self._max_form_len = max(form_lengths)
+
+        # Автомат Ахо-Корасик по всем известным формам: один линейный
+        # проход по тексту вместо токенизации и морфологии
+        self._automaton = ahocorasick.Automaton()
+        for form, lemma in self._form_lemma.items():
+            self._automaton.add_word(form, (lemma, form))
+        self._automaton.make_automaton()
+
+    def _load_cache(self) -> Dict[str, str]:
+        """Загружает кэш лемм с диска, при отсутствии начинает со словаря форм"""
+        try:
+            with open(LEMMA_CACHE_PATH, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # Нет файла или он битый - прогреваем кэш известными формами
+            return {word: lemma.lower() for word, lemma in WORDS_LEMMA.items()}
+
+    def _save_cache(self) -> None:
+        """Атомарно сохраняет кэш лемм на диск (tmp + os.replace)"""
+        if not self._dirty:
+            return
+        tmp_path = LEMMA_CACHE_PATH + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self.cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, LEMMA_CACHE_PATH)
+            self._dirty = 0
+        except OSError:
+            pass  # Кэш - только оптимизация, без него бот тоже работает
+
+    def _lemma(self, word_lower: str) -> str:
+        """Возвращает лемму для уже приведенного к нижнему регистру слова"""
         if word_lower in self.cache:
             return self.cache[word_lower]
-        
+
         if word_lower in self.words_lemma:
-                print("Слово найдено в нашем словаре:", word_lower, "->", self.words_lemma[word_lower])
-                normal_form = self.words_lemma[word_lower].lower()
+            normal_form = self.words_lemma[word_lower].lower()
         else:
-            parsed = self.morph.parse(word_lower)
-            print("Ищем слово в pymorphy3:", word_lower, "->", parsed[0].normal_form)
-            normal_form = parsed[0].normal_form.lower() if parsed else word_lower
+            # normal_forms отдает только строки лемм, без тяжелых объектов Parse
+            forms = self.morph.normal_forms(word_lower)
+            normal_form = forms[0] if forms else word_lower
+        # Интернируем лемму: сравнения и хэши по ней становятся по указателю
+        normal_form = sys.intern(normal_form)
+        logger.debug("Лемма: %s -> %s", word_lower, normal_form)
 
         self.cache[word_lower] = normal_form
+        self._dirty += 1
+        if self._dirty >= LEMMA_CACHE_FLUSH_EVERY:
+            self._save_cache()
         return normal_form
-    
+
+    def normalize_word(self, word: str) -> str:
+        """Приводит слово к начальной форме (напр. ед.ч., именит. падеж для сущ.)"""
+        return self._lemma(_lower(word))
+
+    def _could_be_target(self, word_lower: str) -> bool:
+        """Быстрое сито: может ли слово в принципе быть формой целевого"""
+        return (
+            bool(word_lower)
+            and word_lower[0] in self._first_chars
+            and self._min_form_len <= len(word_lower) <= self._max_form_len
+        )
+
+    @lru_cache(maxsize=LRU_CACHE_SIZE)
     def is_target_word(self, word: str) -> bool:
         """Проверяет, является ли слово формой целевого слова"""
-        normal_form = self.normalize_word(word)
-        return normal_form in self.target_words
+        word_lower = _lower(word)
+        if word_lower in self._form_lemma:
+            return True
+        if not self._could_be_target(word_lower):
+            return False
+        return self._lemma(word_lower) in self.target_words
     
+    @staticmethod
+    def _empty_result(text: str = "") -> Dict:
+        """Результат анализа без единого совпадения"""
+        return {
+            "highlighted": text,
+            "matches": [],
+            "stats": {},
+            "total": 0,
+            "unique": 0,
+        }
+
     def analyze_text(self, text: str) -> Dict:
         """
         Анализирует текст и возвращает результат
         
         Возвращает:
         {
-            "highlighted": str,  # Текст с выделенными словами
+            "highlighted": str,  # Текст с выделенными словами (разметка MarkdownV2)
             "matches": List[Dict],  # Найденные слова
             "stats": Dict[str, int],  # Статистика по словам
             "total": int,  # Всего найдено слов
             "unique": int,  # Уникальных слов
         }
         """
-        if not text.strip():
-            return {
-                "highlighted": "",
-                "matches": [],
-                "stats": {},
-                "total": 0,
-                "unique": 0
-            }
-
-        # Находим все слова в тексте с позициями (razdel возвращает start/end и текст токена)
-        matches = []
-        for token in tokenize(text):
-            word = token.text
-            start = token.start
-            end = token.stop
-
-            if self.is_target_word(word):
-                matches.append({
-                    "word": word,
-                    "normal": self.normalize_word(word),
-                    "start": start,
-                    "end": end,
-                })
-        
-        # Сортируем совпадения с конца для корректного выделения
-        matches_sorted = sorted(matches, key=lambda x: x["start"], reverse=True)
-        
-        # Выделяем слова в тексте
-        highlighted_text = text
-        for match in matches_sorted:
-            word = match["word"]
-            start, end = match["start"], match["end"]
-            # Жирный текст для Telegram (используем MarkdownV2)
-            highlighted_word = f"_{word}_"
-            highlighted_text = highlighted_text[:start] + highlighted_word + highlighted_text[end:]
-        
-        # Считаем статистику
-        stats = {}
-        for match in matches:
-            base_word = match["normal"]
-            stats[base_word] = stats.get(base_word, 0) + 1
-        
+        # Приводим Unicode к единой форме (NFC) и убираем невидимые символы,
+        # иначе одно и то же слово может прийти в разных кодировках
+        if text:
+            text = _CTRL_RE.sub("", unicodedata.normalize("NFC", text))
+
+        if not text or text.isspace():
+            return self._empty_result()
+
+        text_lower = text.lower()
+        # str.lower не сохраняет длину для редких символов (İ -> два символа),
+        # а позиции автомата должны совпадать с исходной строкой - в таком
+        # случае приводим регистр посимвольно
+        if len(text_lower) != len(text):
+            text_lower = "".join(c.lower()[0] for c in text)
+
+        # Если в тексте нет ни одной первой буквы целевых форм,
+        # совпадений точно нет - выходим без сканирования.
+        # highlighted экранируем, как и на основном пути
+        if self._first_chars.isdisjoint(text_lower):
+            return self._empty_result(text.translate(_MD2))
+
+        # Один линейный проход автоматом по тексту в нижнем регистре:
+        # ни токенизации, ни вызовов pymorphy3 на сообщение.
+        # Совпадения храним параллельными списками вместо списка словарей
+        text_len = len(text_lower)
+        words = []
+        normals = []
+        starts = []
+        ends = []
+        for end_index, (normal, form) in self._automaton.iter(text_lower):
+            start = end_index - len(form) + 1
+            end = end_index + 1
+            # Отбрасываем совпадения внутри других слов (нейронка в "нейронками")
+            if start > 0 and text_lower[start - 1].isalpha():
+                continue
+            if end < text_len and text_lower[end].isalpha():
+                continue
+            words.append(text[start:end])
+            normals.append(normal)
+            starts.append(start)
+            ends.append(end)
+
+        # Выделяем слова одним проходом слева направо: копируем куски
+        # исходного текста между совпадениями и склеиваем в конце
+        # (автомат отдает совпадения по возрастанию позиций, сортировка не нужна)
+        # Пользовательский текст экранируем под MarkdownV2, нашу разметку - нет
+        parts = []
+        prev = 0
+        for i in range(len(words)):
+            parts.append(text[prev:starts[i]].translate(_MD2))
+            parts.append("_" + words[i].translate(_MD2) + "_")
+            prev = ends[i]
+        parts.append(text[prev:].translate(_MD2))
+        highlighted_text = "".join(parts)
+
+        # Считаем статистику (Counter считает целиком на стороне C)
+        stats = Counter(normals)
+
+        # Список словарей собираем один раз в конце - внешний формат не меняется
+        matches = [
+            {"word": words[i], "normal": normals[i], "start": starts[i], "end": ends[i]}
+            for i in range(len(words))
+        ]
+
         return {
             "highlighted": highlighted_text,
             "matches": matches,
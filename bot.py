@@ -6,6 +6,10 @@
 #TODO: Пофиксить парсинг текста из сообщений, в которых есть медиа (картинки, файлы и т.д.)
 #TODO: Добавить фичу с анализом ссылок в тексте: открывать ссылку, сравнивать с бан-листом
 
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import (
@@ -28,6 +32,12 @@ from handlers import (
 # Загружаем переменные окружения
 load_dotenv()
 
+async def post_init(application: Application) -> None:
+    """Задает размер пула потоков для CPU-bound анализа текста"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=os.cpu_count())
+    )
+
 def main() -> None:
     """Запускает бота"""
     print("=" * 50)
@@ -36,7 +46,15 @@ def main() -> None:
     print("=" * 50)
     
     # Создаем приложение
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # concurrent_updates: обновления разных пользователей обрабатываются
+    # параллельно, а не последовательно
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(post_init)
+        .concurrent_updates(True)
+        .build()
+    )
     
     # Добавляем обработчики команд
     application.add_handler(CommandHandler("start", start_command))
@@ -40,6 +40,14 @@ WORDS_LEMMA = {
 
 # Максимальная длина текста (чтобы бот не падал на больших текстах)
 MAX_TEXT_LENGTH = 4000
+# Файл с кэшем лемм (переживает перезапуски бота)
+LEMMA_CACHE_PATH = "lemma_cache.pkl"
+
+# Как часто сбрасывать кэш лемм на диск (каждые N новых слов)
+LEMMA_CACHE_FLUSH_EVERY = 100
+
+# Размер lru_cache для проверки целевых слов
+LRU_CACHE_SIZE = 50000
 
 # Настройка логирования
 logging.basicConfig(
@@ -4,27 +4,24 @@
 обработку кнопок и текстовых сообщений.
 """
 
+import asyncio
 import logging
 from telegram import Update, ReplyKeyboardMarkup
-from telegram.constants import ParseMode
+from telegram.constants import ChatAction, ParseMode
 from telegram.ext import ContextTypes, CallbackContext
 from config import TARGET_WORDS, MAX_TEXT_LENGTH, logger
 from analyzer import analyzer
 
-def create_keyboard() -> ReplyKeyboardMarkup:
-    """Создает клавиатуру для бота"""
-    keyboard = [
-        ["📝 Анализировать текст"],
-        ["ℹ️ Помощь", "📋 Слова"]
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, selective=True)
+# Клавиатура и статичные тексты собираются один раз при импорте,
+# обработчики не пересобирают их на каждое сообщение
+_KEYBOARD_LAYOUT = (
+    ("📝 Анализировать текст",),
+    ("ℹ️ Помощь", "📋 Слова"),
+)
+_KEYBOARD = ReplyKeyboardMarkup(_KEYBOARD_LAYOUT, resize_keyboard=True, selective=True)
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик команды /start"""
-    user = update.effective_user
-    
-    welcome_text = f"""
-👋 Привет, {user.first_name}!
+_WELCOME_TMPL = """
+👋 Привет, {name}!
 
 🤖 Умею находить в тексте целевые слова и их формы.
 
@@ -37,17 +34,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 1. Отправьте мне текст
 2. Получите результат с выделенными словами
     """
-    
-    await update.message.reply_text(
-        welcome_text,
-        reply_markup=create_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
-    logger.info(f"Новый пользователь: {user.username} ({user.id})")
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик команды /help"""
-    help_text = f"""
+_HELP_TEXT = f"""
 📚 *Справка по использованию бота*
 
 *Основные команды:*
@@ -69,86 +57,122 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 - Слова с общим корнем, но другой основой (нейросети ≠ нейронка) не выделяются
 - Поддерживаются русские и английские слова
 """
-    
+
+_BUTTON_PROMPT = (
+    "*Отправьте текст для анализа*\n\n"
+    "Можно просто написать или вставить текст сообщением. "
+    f"Максимальная длина: {MAX_TEXT_LENGTH} символов.\n\n"
+    "Я найду все целевые слова и выделю их _курсивом_."
+)
+
+# TARGET_WORDS статичен, поэтому список слов рендерим один раз
+_WORDS_TEXT = (
+    "📋 **Слова для поиска:**\n\n"
+    + "".join(f"{i}. **{word}**\n" for i, word in enumerate(TARGET_WORDS, 1))
+    + f"\nВсего слов: {len(TARGET_WORDS)}"
+)
+
+_TOO_LONG_TMPL = (
+    "❌ **Текст слишком длинный!**\n\n"
+    f"Максимальная длина: {MAX_TEXT_LENGTH} символов\n"
+    "Ваш текст: {n} символов\n\n"
+    "Пожалуйста, разделите текст на части и отправьте по частям."
+)
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /start"""
+    user = update.effective_user
+
     await update.message.reply_text(
-        help_text,
+        _WELCOME_TMPL.format_map({"name": user.first_name}),
+        reply_markup=_KEYBOARD,
+        parse_mode=ParseMode.MARKDOWN
+    )
+    logger.info(f"Новый пользователь: {user.username} ({user.id})")
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /help"""
+    await update.message.reply_text(
+        _HELP_TEXT,
         parse_mode=ParseMode.MARKDOWN
     )
 
 async def words_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает список целевых слов"""
-    words_text = "📋 **Слова для поиска:**\n\n"
-    
-    for i, word in enumerate(TARGET_WORDS, 1):
-        words_text += f"{i}. **{word}**\n"
-    
-    words_text += f"\nВсего слов: {len(TARGET_WORDS)}"
-    
     await update.message.reply_text(
-        words_text,
+        _WORDS_TEXT,
         parse_mode=ParseMode.MARKDOWN
     )
 
+async def _analyze_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Приглашение отправить текст на анализ (кнопка \"Анализировать\")"""
+    await update.message.reply_text(
+        _BUTTON_PROMPT,
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+# Кнопка -> обработчик: новая кнопка добавляется строчкой здесь,
+# сам handle_button менять не нужно
+_BUTTON_DISPATCH = {
+    "📝 Анализировать текст": _analyze_prompt,
+    "ℹ️ Помощь": help_command,
+    "📋 Слова": words_command,
+}
+
 async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает нажатия кнопок"""
-    text = update.message.text
-    
-    if text == "📝 Анализировать текст":
-        await update.message.reply_text(
-            "*Отправьте текст для анализа*\n\n"
-            "Можно просто написать или вставить текст сообщением. "
-            f"Максимальная длина: {MAX_TEXT_LENGTH} символов.\n\n"
-            "Я найду все целевые слова и выделю их _курсивом_.",
-            parse_mode=ParseMode.MARKDOWN
-        )
-    
-    elif text == "ℹ️ Помощь":
-        await help_command(update, context)
-    
-    elif text == "📋 Слова":
-        await words_command(update, context)
+    handler = _BUTTON_DISPATCH.get(update.message.text)
+    if handler is not None:
+        await handler(update, context)
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает текстовые сообщения (анализирует текст)"""
     user = update.effective_user
     text = update.message.text
-    
-    logger.info(f"Пользователь {user.username} ({user.id}) отправил текст: {text[:50]}...")
-    
-    # Проверяем длину текста
-    if len(text) > MAX_TEXT_LENGTH:
+    text_len = len(text)
+
+    # Сначала отсекаем слишком длинный текст, потом уже логируем и работаем
+    if text_len > MAX_TEXT_LENGTH:
         await update.message.reply_text(
-            f"❌ **Текст слишком длинный!**\n\n"
-            f"Максимальная длина: {MAX_TEXT_LENGTH} символов\n"
-            f"Ваш текст: {len(text)} символов\n\n"
-            f"Пожалуйста, разделите текст на части и отправьте по частям.",
+            _TOO_LONG_TMPL.format(n=text_len),
             parse_mode=ParseMode.MARKDOWN
         )
         return
-    
-    # Отправляем сообщение о начале обработки
-    processing_msg = await update.message.reply_text(
-        "🔍 **Анализирую текст...**",
-        parse_mode=ParseMode.MARKDOWN
+
+    # Ленивое форматирование: строка не собирается, если уровень выключен
+    logger.info(
+        "Пользователь %s (%s) отправил текст длиной %d",
+        user.username, user.id, text_len
     )
     
+    # Индикатор "печатает..." вместо сообщения-заглушки: не тратит лимит
+    # сообщений (sendChatAction вне лимита) и не требует удаления.
+    # create_task приложения держит ссылку на задачу и отправляет ее
+    # ошибки в error_handler
+    context.application.create_task(
+        context.bot.send_chat_action(
+            chat_id=update.effective_chat.id,
+            action=ChatAction.TYPING
+        ),
+        update=update,
+    )
+
     try:
-        # Анализируем текст
-        result = analyzer.analyze_text(text)
-        
+        # Анализируем текст в пуле потоков, чтобы не блокировать event loop
+        result = await asyncio.to_thread(analyzer.analyze_text, text)
+
         # Если ничего не найдено
         if result["total"] == 0:
             await update.message.reply_text(
                 "✅ **Банвордов в тексте не обнаружено**\n\n",
                 parse_mode=ParseMode.MARKDOWN
             )
-            await processing_msg.delete()
             return
-        
-        # Отправляем обработанный текст
+
+        # Отправляем обработанный текст (analyzer экранирует его под MarkdownV2)
         await update.message.reply_text(
             result["highlighted"],
-            parse_mode=ParseMode.MARKDOWN
+            parse_mode=ParseMode.MARKDOWN_V2
         )
         """
         Блок кода для отправки статистики
@@ -176,15 +200,14 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         """
 
-        # Удаляем сообщение об обработке
-        await processing_msg.delete()
-        
-        logger.info(f"Пользователь {user.username} - найдено {result['total']} слов")
-        
+        logger.info("Пользователь %s - найдено %d слов", user.username, result["total"])
+
+    except asyncio.CancelledError:
+        # Отмену (например, при остановке бота) не глотаем - пробрасываем дальше
+        raise
     except Exception as e:
-        logger.error(f"Ошибка при анализе текста: {e}")
-        
-        await processing_msg.delete()
+        logger.error("Ошибка при анализе текста: %s", e)
+
         await update.message.reply_text(
             "❌ **Произошла ошибка при анализе текста**\n\n"
             "Попробуйте еще раз или отправьте текст в другом формате.",
@@ -193,13 +216,14 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def error_handler(update: Update, context: CallbackContext) -> None:
     """Обработчик ошибок"""
-    logger.error(f"Ошибка при обработке сообщения: {context.error}")
-    
+    logger.error("Ошибка при обработке сообщения: %s", context.error)
+
     try:
-        if update and update.message:
-            await update.message.reply_text(
+        # effective_message покрывает и отредактированные сообщения
+        if update and update.effective_message:
+            await update.effective_message.reply_text(
                 "😔 **Произошла внутренняя ошибка**\n\n",
                 parse_mode=ParseMode.MARKDOWN
             )
-    except:
-        pass
+    except Exception:
+        logger.exception("Не удалось уведомить пользователя об ошибке")